@@ -0,0 +1,12 @@
+"""Benchmark reprodutível das rotas da aplicação.
+
+    python -m benchmark popular --ordens 100000 --banco /tmp/bench.db
+    python -m benchmark rodar --banco /tmp/bench.db --saida base.json
+    python -m benchmark rodar --banco /tmp/bench.db --modo gunicorn --concorrencia 8 --saida novo.json
+    python -m benchmark comparar base.json novo.json
+
+Os dados são gerados a partir de uma semente fixa, então a mesma linha de
+comando produz o mesmo banco em qualquer máquina. Com USE_SUPABASE=true (e
+SUPABASE_URL apontando para um Postgres local, PG_SSLMODE=disable) o mesmo
+roteiro roda contra o Postgres.
+"""
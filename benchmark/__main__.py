@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+
+def _configurar_ambiente(args):
+    # Precisa acontecer antes do primeiro "import app", que lê o ambiente
+    if args.banco:
+        os.environ['SQLITE_ARQUIVO'] = os.path.abspath(args.banco)
+    # O log de lentidão atrapalharia a medição; só se for pedido explicitamente
+    os.environ.setdefault('METRICAS_CONSULTA_LENTA_MS', '1e9')
+    os.environ.setdefault('METRICAS_REQUISICAO_LENTA_MS', '1e9')
+    # As tarefas enfileiradas ficam pendentes: executá-las no meio da medição
+    # (e depois que a cópia do banco foi apagada) mudaria os números das outras rotas
+    os.environ.setdefault('TAREFAS_ATIVAS', 'false')
+
+
+def _copia_de_trabalho(caminho):
+    # As rotas de escrita alteram o banco: roda sobre uma cópia para que toda
+    # execução parta exatamente dos mesmos dados
+    descritor, destino = tempfile.mkstemp(prefix='benchmark_', suffix='.db')
+    os.close(descritor)
+    origem = sqlite3.connect(caminho)
+    copia = sqlite3.connect(destino)
+    try:
+        origem.backup(copia)
+    finally:
+        copia.close()
+        origem.close()
+    return destino
+
+
+def comando_popular(args):
+    from benchmark import dados
+    vol = dados.volumes(args.ordens, args.clientes, args.itens_por_ordem, args.estoque)
+    print(f"Gerando {vol['clientes']} clientes, {vol['ordens']} ordens (~{vol['itens_por_ordem']} peças cada) "
+          f"e {vol['estoque']} produtos (semente {args.semente})")
+    dados.popular(vol, semente=args.semente, lote=args.lote)
+    print('✅ Banco do benchmark pronto.')
+
+
+def comando_rodar(args):
+    copia = None
+    if not os.getenv('USE_SUPABASE', 'false').lower() == 'true' and not args.sem_copia:
+        origem = os.environ.get('SQLITE_ARQUIVO', 'dados_empresa.db')
+        if not os.path.exists(origem):
+            raise SystemExit(f'{origem} não existe; rode "python -m benchmark popular" antes.')
+        copia = os.environ['SQLITE_ARQUIVO'] = _copia_de_trabalho(origem)
+    try:
+        from benchmark import executar
+        resultado = executar.rodar(
+            modo=args.modo, requisicoes=args.requisicoes, concorrencia=args.concorrencia,
+            aquecimento=args.aquecimento, semente=args.semente, filtro=args.rotas,
+            escritas=not args.sem_escritas, porta=args.porta, workers=args.workers,
+            progresso=lambda texto: print(texto, file=sys.stderr))
+    finally:
+        if copia:
+            for sufixo in ('', '-wal', '-shm'):
+                if os.path.exists(copia + sufixo):
+                    os.remove(copia + sufixo)
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as saida:
+            saida.write(texto + '\n')
+        print(f'✅ Resultado salvo em {args.saida}', file=sys.stderr)
+    else:
+        print(texto)
+
+
+def comando_comparar(args):
+    from benchmark import executar
+    with open(args.base, encoding='utf-8') as arquivo:
+        base = json.load(arquivo)
+    with open(args.novo, encoding='utf-8') as arquivo:
+        novo = json.load(arquivo)
+    print(f"base: {base['meta'].get('commit')}  novo: {novo['meta'].get('commit')}")
+    linhas, regressoes = executar.comparar(base, novo, args.limiar)
+    print('\n'.join(linhas))
+    if regressoes:
+        print(f'\n⚠ {len(regressoes)} piora(s) acima de {args.limiar:g}%')
+        if args.falhar:
+            raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Benchmark das rotas da aplicação.')
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    popular = subcomandos.add_parser('popular', help='gera dados sintéticos num banco vazio')
+    popular.add_argument('--banco', help='arquivo SQLite (padrão: SQLITE_ARQUIVO ou dados_empresa.db)')
+    popular.add_argument('--ordens', type=int, default=1000)
+    popular.add_argument('--clientes', type=int, help='padrão: ordens / 5')
+    popular.add_argument('--itens-por-ordem', type=int, default=3)
+    popular.add_argument('--estoque', type=int, help='padrão: ordens / 2')
+    popular.add_argument('--semente', type=int, default=42)
+    popular.add_argument('--lote', type=int, default=10000)
+    popular.set_defaults(funcao=comando_popular)
+
+    rodar = subcomandos.add_parser('rodar', help='mede as rotas e gera o JSON de resultados')
+    rodar.add_argument('--banco', help='arquivo SQLite populado (padrão: SQLITE_ARQUIVO ou dados_empresa.db)')
+    rodar.add_argument('--modo', choices=['cliente', 'gunicorn'], default='cliente',
+                       help='test client do Flask no mesmo processo, ou um gunicorn local via HTTP')
+    rodar.add_argument('--requisicoes', type=int, default=200, help='requisições medidas por rota')
+    rodar.add_argument('--aquecimento', type=int, default=10, help='requisições descartadas por rota')
+    rodar.add_argument('--concorrencia', type=int, default=1)
+    rodar.add_argument('--workers', type=int, default=2, help='workers do gunicorn (modo gunicorn)')
+    rodar.add_argument('--porta', type=int, default=8765)
+    rodar.add_argument('--semente', type=int, default=42)
+    rodar.add_argument('--rotas', nargs='*', help='só as rotas cujo nome contém algum destes trechos')
+    rodar.add_argument('--sem-escritas', action='store_true', help='não mede as rotas POST')
+    rodar.add_argument('--sem-copia', action='store_true', help='roda direto no banco, sem cópia de trabalho')
+    rodar.add_argument('--saida', help='arquivo JSON de saída (padrão: stdout)')
+    rodar.set_defaults(funcao=comando_rodar)
+
+    comparar = subcomandos.add_parser('comparar', help='compara dois resultados')
+    comparar.add_argument('base')
+    comparar.add_argument('novo')
+    comparar.add_argument('--limiar', type=float, default=10.0, help='variação (%%) considerada piora')
+    comparar.add_argument('--falhar', action='store_true', help='sai com código 1 se houver piora')
+    comparar.set_defaults(funcao=comando_comparar)
+
+    args = parser.parse_args()
+    if args.comando != 'comparar':
+        _configurar_ambiente(args)
+    args.funcao(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Gerador de dados sintéticos para o benchmark."""
+import csv
+import io
+import itertools
+import random
+from datetime import date, timedelta
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela',
+         'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago']
+SOBRENOMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Carvalho', 'Ferreira',
+              'Rodrigues', 'Almeida', 'Costa', 'Gomes', 'Martins', 'Araújo', 'Barbosa', 'Ribeiro']
+BAIRROS = ['Centro', 'Jardim América', 'Vila Nova', 'Boa Vista', 'Santa Mônica', 'Alto da Glória']
+TIPOS_ITEM = ['Cortina', 'Persiana', 'Papel de Parede']
+MATERIAIS = ['linho', 'blackout', 'voil', 'tela solar', 'vinílico', 'rolô']
+STATUS = ['Pendente', 'Instalado', 'Em manutenção', 'Danificado']
+
+# Datas espalhadas por três anos a partir de uma data fixa (e não de hoje),
+# para o mesmo comando gerar sempre o mesmo banco
+DATA_BASE = date(2023, 1, 1)
+DIAS = 3 * 365
+
+
+def volumes(ordens, clientes=None, itens_por_ordem=3, estoque=None):
+    return {
+        'ordens': ordens,
+        'clientes': clientes if clientes is not None else max(1, ordens // 5),
+        'itens_por_ordem': itens_por_ordem,
+        'estoque': estoque if estoque is not None else max(1, ordens // 2),
+    }
+
+
+def _cpf(rnd):
+    import app
+    numeros = [rnd.randint(0, 9) for _ in range(9)]
+    pesos = [11, 10, 9, 8, 7, 6, 5, 4, 3, 2]
+    numeros.append(app._digito_verificador(numeros, pesos[1:]))
+    numeros.append(app._digito_verificador(numeros, pesos))
+    texto = ''.join(map(str, numeros))
+    return f'{texto[:3]}.{texto[3:6]}.{texto[6:9]}-{texto[9:]}'
+
+
+def _data(rnd):
+    return (DATA_BASE + timedelta(days=rnd.randrange(DIAS))).isoformat()
+
+
+def gerar_clientes(rnd, total):
+    for id in range(1, total + 1):
+        nome = f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}'
+        yield (id, nome, _cpf(rnd), f'Rua {rnd.randint(1, 999)}, {rnd.choice(BAIRROS)}',
+               f'(11) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}',
+               f'{nome.split()[0].lower()}{id}@exemplo.com')
+
+
+def gerar_ordens(rnd, total, clientes):
+    for id in range(1, total + 1):
+        yield (id, rnd.randint(1, clientes), _data(rnd), f'{rnd.randint(8, 17):02d}:{rnd.choice(["00", "30"])}',
+               f'{rnd.choice(BAIRROS)} - sala {rnd.randint(1, 20)}', rnd.choice(MATERIAIS),
+               rnd.choice(STATUS))
+
+
+def gerar_itens(rnd, ordens, itens_por_ordem):
+    for ordem_id in range(1, ordens + 1):
+        # Em média itens_por_ordem peças, variando de 1 a 2x a média
+        for _ in range(rnd.randint(1, max(1, 2 * itens_por_ordem - 1))):
+            yield (ordem_id, rnd.choice(TIPOS_ITEM), round(rnd.uniform(0.8, 5.5), 2),
+                   round(rnd.uniform(0.6, 7.0), 2), rnd.choice(MATERIAIS))
+
+
+def gerar_estoque(rnd, total, clientes):
+    import app
+    for numero in range(1, total + 1):
+        yield (f'Produto {numero:06d}', rnd.choice(app.TIPOS_PRODUTO), rnd.randint(1, 40),
+               rnd.choice(app.STATUS_PRODUTO), rnd.choice([None, rnd.randint(1, clientes)]),
+               _data(rnd), None, None)
+
+
+TABELAS = [
+    ('clientes', ['id', 'nome', 'cpf_cnpj', 'endereco', 'telefone', 'email']),
+    ('ordens_servico', ['id', 'cliente_id', 'data_servico', 'hora_servico', 'local_servico',
+                        'materiais', 'status']),
+    ('itens_ordem', ['ordem_id', 'tipo', 'altura', 'comprimento', 'material']),
+    ('estoque', ['nome_produto', 'tipo', 'quantidade', 'status', 'cliente_id', 'data_entrada',
+                 'data_saida', 'observacoes']),
+]
+
+
+def _carregar(cursor, postgres, tabela, colunas, linhas, lote):
+    while True:
+        bloco = list(itertools.islice(linhas, lote))
+        if not bloco:
+            return
+        if postgres:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(bloco)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            marcadores = ', '.join('?' * len(colunas))
+            cursor.executemany(f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({marcadores})", bloco)
+
+
+def popular(vol, semente=42, lote=10000, progresso=print):
+    """Cria o esquema e carrega os volumes pedidos num banco vazio."""
+    import app
+    app.inicializar_banco()
+    conn = app.conectar()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM clientes")
+    if cursor.fetchone()[0]:
+        raise SystemExit("O banco já tem dados; use um arquivo/banco novo para o benchmark.")
+
+    rnd = random.Random(semente)
+    geradores = {
+        'clientes': gerar_clientes(rnd, vol['clientes']),
+        'ordens_servico': gerar_ordens(rnd, vol['ordens'], vol['clientes']),
+        'itens_ordem': gerar_itens(rnd, vol['ordens'], vol['itens_por_ordem']),
+        'estoque': gerar_estoque(rnd, vol['estoque'], vol['clientes']),
+    }
+    for tabela, colunas in TABELAS:
+        progresso(f'Carregando {tabela}...')
+        _carregar(cursor, app.USE_SUPABASE, tabela, colunas, geradores[tabela], lote)
+    if app.USE_SUPABASE:
+        # Os ids vieram explícitos: acerta as sequências para os próximos INSERTs
+        for tabela in ('clientes', 'ordens_servico'):
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{tabela}', 'id'), (SELECT MAX(id) FROM {tabela}))")
+    cursor.execute("ANALYZE")
+    conn.commit()
+    cursor.close()
+    conn.close()
@@ -0,0 +1,256 @@
+"""Execução das rotas e cálculo das estatísticas do benchmark."""
+import http.client
+import io
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmark import rotas as catalogo
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ClienteFlask:
+    """Chama a aplicação no mesmo processo, pelo test client do Flask."""
+
+    def __init__(self):
+        import app
+        self._app = app.app
+        self._local = threading.local()
+
+    def _cliente(self):
+        if not hasattr(self._local, 'cliente'):
+            self._local.cliente = self._app.test_client()
+        return self._local.cliente
+
+    def requisitar(self, metodo, url, formulario=None, arquivos=None, cabecalhos=None):
+        dados = dict(formulario or {})
+        for campo, (nome, conteudo) in (arquivos or {}).items():
+            dados[campo] = (io.BytesIO(conteudo), nome)
+        resposta = self._cliente().open(url, method=metodo, data=dados or None, headers=cabecalhos or {})
+        # Consome o corpo todo (as exportações são geradas enquanto são lidas)
+        resposta.get_data()
+        return resposta.status_code
+
+    def cabecalho(self, url, nome):
+        return self._cliente().get(url).headers.get(nome)
+
+    def fechar(self):
+        pass
+
+
+def _multipart(formulario, arquivos):
+    fronteira = uuid.uuid4().hex
+    partes = []
+    for campo, valores in formulario.items():
+        for valor in valores if isinstance(valores, list) else [valores]:
+            partes.append(f'--{fronteira}\r\nContent-Disposition: form-data; name="{campo}"\r\n\r\n{valor}\r\n'.encode())
+    for campo, (nome, conteudo) in arquivos.items():
+        partes.append(f'--{fronteira}\r\nContent-Disposition: form-data; name="{campo}"; filename="{nome}"\r\n'
+                      f'Content-Type: text/csv\r\n\r\n'.encode() + conteudo + b'\r\n')
+    partes.append(f'--{fronteira}--\r\n'.encode())
+    return b''.join(partes), f'multipart/form-data; boundary={fronteira}'
+
+
+class ClienteHTTP:
+    """Fala HTTP com um servidor de verdade; uma conexão keep-alive por thread."""
+
+    def __init__(self, host, porta):
+        self.host = host
+        self.porta = porta
+        self._local = threading.local()
+
+    def _conexao(self):
+        if not hasattr(self._local, 'conexao'):
+            self._local.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=60)
+        return self._local.conexao
+
+    def requisitar(self, metodo, url, formulario=None, arquivos=None, cabecalhos=None):
+        cabecalhos = dict(cabecalhos or {})
+        corpo = None
+        if arquivos:
+            corpo, cabecalhos['Content-Type'] = _multipart(formulario or {}, arquivos)
+        elif formulario is not None:
+            corpo = urllib.parse.urlencode(formulario, doseq=True).encode()
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        for tentativa in range(2):
+            conexao = self._conexao()
+            try:
+                conexao.request(metodo, url, body=corpo, headers=cabecalhos)
+                resposta = conexao.getresponse()
+                resposta.read()
+                return resposta.status
+            except (http.client.HTTPException, ConnectionError):
+                # Servidor fechou a conexão keep-alive: abre outra e repete uma vez
+                conexao.close()
+                del self._local.conexao
+                if tentativa:
+                    raise
+
+    def cabecalho(self, url, nome):
+        conexao = http.client.HTTPConnection(self.host, self.porta, timeout=60)
+        try:
+            conexao.request('GET', url)
+            resposta = conexao.getresponse()
+            resposta.read()
+            return resposta.getheader(nome)
+        finally:
+            conexao.close()
+
+    def fechar(self):
+        pass
+
+
+def iniciar_gunicorn(porta, workers, ambiente):
+    comando = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{porta}', '--workers', str(workers),
+               '--log-level', 'warning', 'app:app']
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente)
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise SystemExit(f'gunicorn terminou ao iniciar (código {processo.returncode})')
+        try:
+            conexao = http.client.HTTPConnection('127.0.0.1', porta, timeout=1)
+            conexao.request('GET', '/status/pool')
+            conexao.getresponse().read()
+            conexao.close()
+            return processo
+        except OSError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise SystemExit('gunicorn não respondeu em 30 s')
+
+
+def percentil(ordenados, p):
+    # Nearest-rank: o menor valor com pelo menos p% das amostras até ele
+    if not ordenados:
+        return None
+    posicao = max(0, min(len(ordenados) - 1, int(-(-p * len(ordenados) // 100)) - 1))
+    return ordenados[posicao]
+
+
+def _semente_rota(semente, nome):
+    # Semente por rota estável entre execuções (hash() de str muda a cada processo)
+    return semente ^ zlib.crc32(nome.encode())
+
+
+def medir_rota(cliente, nome, metodo, gerador, ctx, requisicoes, concorrencia, aquecimento, semente):
+    rnd = random.Random(_semente_rota(semente, nome))
+    pedidos = [gerador(rnd, ctx) for _ in range(aquecimento + requisicoes)]
+    for url, formulario, arquivos, cabecalhos in pedidos[:aquecimento]:
+        cliente.requisitar(metodo, url, formulario, arquivos, cabecalhos)
+
+    def executar(pedido):
+        url, formulario, arquivos, cabecalhos = pedido
+        inicio = time.perf_counter()
+        try:
+            status = cliente.requisitar(metodo, url, formulario, arquivos, cabecalhos)
+        except Exception:
+            status = None
+        return time.perf_counter() - inicio, status
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(executar, pedidos[aquecimento:]))
+    total = time.perf_counter() - inicio
+
+    tempos = sorted(duracao for duracao, _ in resultados)
+    erros = sum(1 for _, status in resultados if status is None or status >= 500)
+    em_ms = lambda valor: round(valor * 1000, 3) if valor is not None else None
+    return {
+        'requisicoes': len(resultados),
+        'erros': erros,
+        'status': sorted({status for _, status in resultados if status is not None}),
+        'p50_ms': em_ms(percentil(tempos, 50)),
+        'p95_ms': em_ms(percentil(tempos, 95)),
+        'p99_ms': em_ms(percentil(tempos, 99)),
+        'media_ms': em_ms(sum(tempos) / len(tempos)) if tempos else None,
+        'max_ms': em_ms(tempos[-1]) if tempos else None,
+        'rps': round(len(resultados) / total, 2) if total else None,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rodar(modo='cliente', requisicoes=200, concorrencia=1, aquecimento=10, semente=42, filtro=None,
+          escritas=True, porta=8765, workers=2, progresso=print):
+    import app
+    selecionadas = [rota for rota in (catalogo.ROTAS if escritas else catalogo.LEITURAS)
+                    if not filtro or any(parte in rota[0] for parte in filtro)]
+
+    processo = None
+    if modo == 'gunicorn':
+        processo = iniciar_gunicorn(porta, workers, dict(os.environ))
+        cliente = ClienteHTTP('127.0.0.1', porta)
+    else:
+        cliente = ClienteFlask()
+    try:
+        ctx = catalogo.contexto(cliente)
+        resultado = {}
+        for nome, metodo, gerador in selecionadas:
+            progresso(f'{nome}...')
+            resultado[nome] = medir_rota(cliente, nome, metodo, gerador, ctx, requisicoes, concorrencia,
+                                         aquecimento, semente)
+    finally:
+        cliente.fechar()
+        if processo is not None:
+            processo.terminate()
+            processo.wait(timeout=10)
+
+    return {
+        'meta': {
+            'commit': _commit(),
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'modo': modo,
+            'workers': workers if modo == 'gunicorn' else None,
+            'concorrencia': concorrencia,
+            'requisicoes_por_rota': requisicoes,
+            'aquecimento': aquecimento,
+            'semente': semente,
+            'backend': 'postgres' if app.USE_SUPABASE else 'sqlite',
+            'volumes': {chave: ctx[chave] for chave in ('clientes', 'ordens', 'estoque')},
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'rotas': resultado,
+    }
+
+
+def comparar(base, novo, limiar=10.0):
+    """Linhas de texto com a variação por rota e a lista das regressões."""
+    linhas = [f"{'rota':<28} {'p50 (ms)':>22} {'p95 (ms)':>22} {'req/s':>22}"]
+    regressoes = []
+    for nome in list(base['rotas']) + [n for n in novo['rotas'] if n not in base['rotas']]:
+        antes, depois = base['rotas'].get(nome), novo['rotas'].get(nome)
+        if antes is None or depois is None:
+            linhas.append(f"{nome:<28} {'só em ' + ('novo' if antes is None else 'base'):>22}")
+            continue
+        colunas = []
+        for campo, maior_e_pior in (('p50_ms', True), ('p95_ms', True), ('rps', False)):
+            a, d = antes[campo], depois[campo]
+            if not a or d is None:
+                colunas.append(f"{'—':>22}")
+                continue
+            variacao = (d - a) / a * 100
+            pior = variacao > limiar if maior_e_pior else variacao < -limiar
+            if pior:
+                regressoes.append((nome, campo, variacao))
+            colunas.append(f"{f'{a:g} → {d:g} ({variacao:+.1f}%)' + (' ⚠' if pior else ''):>22}")
+        linhas.append(f"{nome:<28} {' '.join(colunas)}")
+    return linhas, regressoes
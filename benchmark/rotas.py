@@ -0,0 +1,178 @@
+"""Rotas exercitadas pelo benchmark e como sortear os parâmetros de cada uma.
+
+Cada rota é (nome, método, gerador); o gerador recebe um random.Random e o
+contexto do banco (totais, cursores de página, ETag) e devolve
+(url, formulário, arquivos, cabeçalhos). As leituras vêm primeiro e as
+escritas por último, para que estas não mudem o que aquelas medem.
+"""
+import random
+import urllib.parse
+from datetime import timedelta
+
+from benchmark import dados
+
+
+def _id(rnd, total):
+    return rnd.randint(1, max(1, total))
+
+
+def _ids(rnd, total, quantidade=50):
+    return ','.join(str(id) for id in rnd.sample(range(1, max(1, total) + 1), min(quantidade, max(1, total))))
+
+
+def _periodo(rnd, dias=30):
+    inicio = dados.DATA_BASE + timedelta(days=rnd.randrange(dados.DIAS))
+    return inicio.isoformat(), (inicio + timedelta(days=dias)).isoformat()
+
+
+def _get(url, cabecalhos=None):
+    return url, None, None, cabecalhos or {}
+
+
+def _busca(caminho, termo):
+    return _get(f'{caminho}?filtro={urllib.parse.quote(termo)}')
+
+
+def _itens_formulario(rnd, quantidade=3):
+    itens = [(rnd.choice(dados.TIPOS_ITEM), f'{rnd.uniform(0.8, 5.5):.2f}', f'{rnd.uniform(0.6, 7.0):.2f}',
+              rnd.choice(dados.MATERIAIS)) for _ in range(quantidade)]
+    return {
+        'tipo[]': [item[0] for item in itens],
+        'altura[]': [item[1] for item in itens],
+        'comprimento[]': [item[2] for item in itens],
+        'material[]': [item[3] for item in itens],
+    }
+
+
+def _cliente_formulario(rnd):
+    return {
+        'nome': f'{rnd.choice(dados.NOMES)} {rnd.choice(dados.SOBRENOMES)}',
+        'cpf_cnpj': dados._cpf(rnd),
+        'endereco': f'Rua {rnd.randint(1, 999)}',
+        'telefone': '(11) 90000-0000',
+        'email': 'bench@exemplo.com',
+    }
+
+
+def _produto_formulario(rnd, ctx):
+    import app
+    return {
+        'nome_produto': f'Bench {rnd.randint(1, 10 ** 6)}',
+        'tipo': rnd.choice(app.TIPOS_PRODUTO),
+        'quantidade': str(rnd.randint(1, 40)),
+        'status': rnd.choice(app.STATUS_PRODUTO),
+        'cliente_id': str(_id(rnd, ctx['clientes'])),
+        'data_entrada': _periodo(rnd)[0],
+        'data_saida': '',
+        'observacoes': '',
+    }
+
+
+def _csv_clientes(rnd, linhas=100):
+    texto = ['nome,cpf_cnpj,endereco,telefone,email']
+    for _ in range(linhas):
+        cliente = _cliente_formulario(rnd)
+        texto.append(','.join(cliente[campo] for campo in ('nome', 'cpf_cnpj', 'endereco', 'telefone', 'email')))
+    return '\n'.join(texto).encode('utf-8')
+
+
+LEITURAS = [
+    ('index', 'GET', lambda rnd, ctx: _get('/')),
+    ('clientes', 'GET', lambda rnd, ctx: _get('/clientes')),
+    ('clientes_gzip', 'GET', lambda rnd, ctx: _get('/clientes', {'Accept-Encoding': 'gzip'})),
+    ('clientes_pagina_profunda', 'GET', lambda rnd, ctx: _get(f"/clientes?apos={ctx['cursor_clientes']}")),
+    ('clientes_busca', 'GET', lambda rnd, ctx: _busca('/clientes', rnd.choice(dados.SOBRENOMES))),
+    ('ordens', 'GET', lambda rnd, ctx: _get('/ordens_servico')),
+    ('ordens_pagina_profunda', 'GET', lambda rnd, ctx: _get(f"/ordens_servico?apos={ctx['cursor_ordens']}")),
+    ('ordens_busca', 'GET', lambda rnd, ctx: _busca('/ordens_servico', rnd.choice(dados.NOMES))),
+    ('estoque', 'GET', lambda rnd, ctx: _get('/estoque')),
+    ('estoque_busca', 'GET', lambda rnd, ctx: _busca('/estoque', rnd.choice(['cortina', 'toldo', 'pendente']))),
+    ('cadastro_cliente', 'GET', lambda rnd, ctx: _get('/cadastro_cliente')),
+    ('estatico_css', 'GET', lambda rnd, ctx: _get(ctx['css'], {'Accept-Encoding': 'gzip'})),
+    ('cadastro_os', 'GET', lambda rnd, ctx: _get('/cadastro_os')),
+    ('cadastro_estoque', 'GET', lambda rnd, ctx: _get('/cadastro_estoque')),
+    ('editar_cliente', 'GET', lambda rnd, ctx: _get(f"/editar_cliente/{_id(rnd, ctx['clientes'])}")),
+    ('editar_os', 'GET', lambda rnd, ctx: _get(f"/editar_os/{_id(rnd, ctx['ordens'])}")),
+    ('editar_estoque', 'GET', lambda rnd, ctx: _get(f"/editar_estoque/{_id(rnd, ctx['estoque'])}")),
+    ('ficha_os', 'GET', lambda rnd, ctx: _get(f"/ficha_os/{_id(rnd, ctx['ordens'])}")),
+    ('agenda_semana', 'GET', lambda rnd, ctx: _get(f'/agenda?inicio={_periodo(rnd)[0]}')),
+    ('api_agenda_tarde', 'GET',
+     lambda rnd, ctx: _get('/api/agenda?inicio={0}T12:00&fim={0}T18:00'.format(_periodo(rnd)[0]))),
+    ('fichas_os_dia', 'GET', lambda rnd, ctx: _get(f'/fichas_os?data={_periodo(rnd)[0]}')),
+    ('fichas_os_lote_50', 'GET', lambda rnd, ctx: _get(f"/fichas_os?ids={_ids(rnd, ctx['ordens'])}")),
+    ('relatorio_materiais', 'GET',
+     lambda rnd, ctx: _get('/relatorio_materiais?inicio={}&fim={}'.format(*_periodo(rnd)))),
+    ('exportar_itens_mes', 'GET',
+     lambda rnd, ctx: _get('/exportar/itens?inicio={}&fim={}'.format(*_periodo(rnd)))),
+    ('api_clientes', 'GET', lambda rnd, ctx: _get('/api/clientes')),
+    ('api_ordens', 'GET', lambda rnd, ctx: _get('/api/ordens')),
+    ('api_ordens_304', 'GET', lambda rnd, ctx: _get('/api/ordens', {'If-None-Match': ctx['etag_ordens']})),
+    ('api_estoque', 'GET', lambda rnd, ctx: _get('/api/estoque')),
+    ('api_ficha', 'GET', lambda rnd, ctx: _get(f"/api/ordens/{_id(rnd, ctx['ordens'])}")),
+    ('estoque_resumo', 'GET', lambda rnd, ctx: _get('/estoque/resumo')),
+    ('api_estoque_resumo', 'GET', lambda rnd, ctx: _get(f"/api/estoque/resumo?cliente={_id(rnd, ctx['clientes'])}")),
+    ('tarefas', 'GET', lambda rnd, ctx: _get('/tarefas')),
+    ('api_tarefa', 'GET', lambda rnd, ctx: _get(f"/api/tarefas/{ctx['tarefa']}")),
+    ('status_pool', 'GET', lambda rnd, ctx: _get('/status/pool')),
+    ('metrics', 'GET', lambda rnd, ctx: _get('/metrics')),
+]
+
+ESCRITAS = [
+    ('cadastro_cliente_post', 'POST', lambda rnd, ctx: ('/cadastro_cliente', _cliente_formulario(rnd), None, {})),
+    ('editar_cliente_post', 'POST',
+     lambda rnd, ctx: (f"/editar_cliente/{_id(rnd, ctx['clientes'])}", _cliente_formulario(rnd), None, {})),
+    ('cadastro_os_post', 'POST', lambda rnd, ctx: ('/cadastro_os', {
+        'cliente': str(_id(rnd, ctx['clientes'])), 'local': 'Bench', 'data': _periodo(rnd)[0],
+        'hora': '10:00', 'status': 'Pendente', 'observacoes': '', **_itens_formulario(rnd)}, None, {})),
+    ('editar_os_post', 'POST', lambda rnd, ctx: (f"/editar_os/{_id(rnd, ctx['ordens'])}", {
+        'cliente_id': str(_id(rnd, ctx['clientes'])), 'data_servico': _periodo(rnd)[0],
+        'hora_servico': '14:30', 'local_servico': 'Bench', 'materiais': '', 'status': 'Instalado',
+        'item_id[]': ['', ''], **_itens_formulario(rnd, 2)}, None, {})),
+    ('cadastro_estoque_post', 'POST', lambda rnd, ctx: ('/cadastro_estoque', _produto_formulario(rnd, ctx), None, {})),
+    ('editar_estoque_post', 'POST',
+     lambda rnd, ctx: (f"/editar_estoque/{_id(rnd, ctx['estoque'])}", _produto_formulario(rnd, ctx), None, {})),
+    # Ações em lote que não apagam nada, para as rotas seguintes medirem o mesmo banco
+    ('acoes_ordens_status_50', 'POST', lambda rnd, ctx: ('/acoes/ordens', {
+        'acao': 'status', 'status': rnd.choice(dados.STATUS), 'voltar': '/ordens_servico',
+        'ids[]': _ids(rnd, ctx['ordens']).split(',')}, None, {})),
+    ('acoes_estoque_liberar_50', 'POST', lambda rnd, ctx: ('/acoes/estoque', {
+        'acao': 'liberar', 'data_saida': _periodo(rnd)[0], 'voltar': '/estoque',
+        'ids[]': _ids(rnd, ctx['estoque']).split(',')}, None, {})),
+    # Só o enfileiramento (202); a exportação roda depois, na fila
+    ('tarefa_exportar_itens_mes', 'POST', lambda rnd, ctx: ('/tarefas/exportacao?formato=json', dict(
+        zip(('inicio', 'fim'), _periodo(rnd)), entidade='itens'), None, {})),
+    ('importar_clientes_100', 'POST',
+     lambda rnd, ctx: ('/importar/clientes?formato=json', {}, {'arquivo': ('clientes.csv', _csv_clientes(rnd))}, {})),
+]
+
+ROTAS = LEITURAS + ESCRITAS
+
+
+def contexto(cliente):
+    """Totais e parâmetros que dependem do banco já populado."""
+    import app
+    import consultas
+    conn = app.conectar()
+    cursor = conn.cursor()
+    ctx = {}
+    for chave, tabela in (('clientes', 'clientes'), ('ordens', 'ordens_servico'), ('estoque', 'estoque')):
+        cursor.execute(f"SELECT COUNT(*) FROM {tabela}")
+        ctx[chave] = cursor.fetchone()[0]
+    # Cursores de paginação no meio das listagens (páginas "profundas")
+    consultas.executar_sql(cursor, 'bench', "SELECT nome, id FROM clientes ORDER BY nome, id LIMIT 1 OFFSET ?",
+                           (ctx['clientes'] // 2,))
+    ctx['cursor_clientes'] = app.codificar_cursor(list(cursor.fetchone() or ['', 0]))
+    consultas.executar_sql(cursor, 'bench', """
+        SELECT COALESCE(data_servico, ''), id FROM ordens_servico
+        ORDER BY COALESCE(data_servico, '') DESC, id DESC LIMIT 1 OFFSET ?
+    """, (ctx['ordens'] // 2,))
+    ctx['cursor_ordens'] = app.codificar_cursor(list(cursor.fetchone() or ['', 0]))
+    cursor.close()
+    conn.close()
+    # Uma tarefa pequena para consultar o andamento
+    inicio, fim = _periodo(random.Random(0))
+    ctx['tarefa'] = app.fila.enfileirar('relatorio_materiais', {'inicio': inicio, 'fim': fim})
+    ctx['etag_ordens'] = cliente.cabecalho('/api/ordens', 'ETag') or '""'
+    with app.app.test_request_context():
+        ctx['css'] = app.url_estatico('css/villa.css')
+    return ctx
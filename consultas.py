@@ -0,0 +1,505 @@
+"""Registro central das consultas SQL da aplicação.
+
+Cada comando é escrito uma única vez, com marcadores "?", e renderizado para
+o dialeto ativo. No Postgres os comandos viram prepared statements (PREPARE
+uma vez por conexão, depois só EXECUTE); no SQLite o texto sempre idêntico
+reaproveita o cache de comandos do próprio sqlite3. Cada execução é contada
+por nome, para sabermos quais comandos pesam mais.
+"""
+import csv
+import hashlib
+import io
+import json
+import threading
+import time
+
+CONSULTAS = {
+    # Clientes
+    'cliente_por_id': "SELECT * FROM clientes WHERE id = ?",
+    'cliente_nome': "SELECT nome FROM clientes WHERE id = ?",
+    'clientes_lista': "SELECT id, nome FROM clientes ORDER BY nome",
+    'cliente_inserir': """
+        INSERT INTO clientes (nome, cpf_cnpj, endereco, telefone, email)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    'cliente_atualizar': """
+        UPDATE clientes
+        SET nome=?, cpf_cnpj=?, endereco=?, telefone=?, email=?
+        WHERE id=?
+    """,
+
+    # Ordens de serviço
+    'ordem_por_id': "SELECT * FROM ordens_servico WHERE id = ?",
+    'ordem_inserir': """
+        INSERT INTO ordens_servico (
+            cliente_id, local_servico, data_servico, hora_servico, materiais, status
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    'ordem_atualizar': """
+        UPDATE ordens_servico
+        SET cliente_id=?, data_servico=?, hora_servico=?, local_servico=?, materiais=?, status=?
+        WHERE id=?
+    """,
+    'itens_da_ordem': "SELECT * FROM itens_ordem WHERE ordem_id = ? ORDER BY id",
+    'itens_da_ordem_valores': "SELECT id, tipo, altura, comprimento, material FROM itens_ordem WHERE ordem_id = ?",
+    'itens_excluir': {
+        'sqlite': "DELETE FROM itens_ordem WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "DELETE FROM itens_ordem WHERE id = ANY(?)",
+    },
+    # Agenda: intervalos sobre o início derivado (idx_ordens_inicio)
+    'agenda_periodo': """
+        SELECT os.id, os.inicio_servico, c.nome, os.local_servico, os.status
+        FROM ordens_servico os
+        LEFT JOIN clientes c ON c.id = os.cliente_id
+        WHERE os.inicio_servico >= ? AND os.inicio_servico < ?
+        ORDER BY os.inicio_servico, os.id
+        LIMIT ?
+    """,
+    'agenda_inicio': "SELECT inicio_servico FROM ordens_servico WHERE id = ?",
+    'agenda_conflitos': """
+        SELECT os.id, os.inicio_servico, c.nome, os.local_servico, os.status
+        FROM ordens_servico os
+        LEFT JOIN clientes c ON c.id = os.cliente_id
+        WHERE os.inicio_servico > ? AND os.inicio_servico < ?
+          AND length(os.inicio_servico) > 10 AND os.id <> ?
+        ORDER BY os.inicio_servico, os.id
+    """,
+
+    # Fichas em lote: ordens, clientes e peças de várias OS, um comando cada
+    'ordens_por_ids': {
+        'sqlite': "SELECT * FROM ordens_servico WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "SELECT * FROM ordens_servico WHERE id = ANY(?)",
+    },
+    'ordens_do_dia': """
+        SELECT * FROM ordens_servico
+        WHERE COALESCE(data_servico, '') = ?
+        ORDER BY hora_servico, id
+        LIMIT ?
+    """,
+    'clientes_nomes': {
+        'sqlite': "SELECT id, nome FROM clientes WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "SELECT id, nome FROM clientes WHERE id = ANY(?)",
+    },
+    'itens_das_ordens': {
+        'sqlite': "SELECT * FROM itens_ordem WHERE ordem_id IN (SELECT value FROM json_each(?)) ORDER BY ordem_id, id",
+        'postgres': "SELECT * FROM itens_ordem WHERE ordem_id = ANY(?) ORDER BY ordem_id, id",
+    },
+    'materiais_periodo': """
+        SELECT os.data_servico, i.tipo, i.material, i.altura, i.comprimento
+        FROM ordens_servico os
+        JOIN itens_ordem i ON i.ordem_id = os.id
+        WHERE COALESCE(os.data_servico, '') BETWEEN ? AND ?
+    """,
+
+    # Estoque
+    'produto_por_id': "SELECT * FROM estoque WHERE id = ?",
+    'produto_inserir': """
+        INSERT INTO estoque (nome_produto, tipo, quantidade, status, cliente_id, data_entrada, observacoes)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    'produto_atualizar': """
+        UPDATE estoque
+        SET nome_produto=?, tipo=?, quantidade=?, status=?, cliente_id=?, data_entrada=?, data_saida=?, observacoes=?
+        WHERE id=?
+    """,
+    'produto_excluir': "DELETE FROM estoque WHERE id = ?",
+    # O resumo tem uma linha por tipo/status/cliente: agrupar é barato
+    'estoque_resumo': """
+        SELECT tipo, status, SUM(quantidade), SUM(produtos)
+        FROM estoque_resumo
+        GROUP BY tipo, status
+    """,
+    'estoque_resumo_cliente': """
+        SELECT tipo, status, quantidade, produtos
+        FROM estoque_resumo
+        WHERE cliente_id = ?
+    """,
+    'estoque_minimos': "SELECT tipo, status, minimo FROM estoque_minimo",
+    'estoque_minimo_definir': """
+        INSERT INTO estoque_minimo (tipo, status, minimo) VALUES (?, ?, ?)
+        ON CONFLICT (tipo, status) DO UPDATE SET minimo = excluded.minimo
+    """,
+    'estoque_minimo_remover': "DELETE FROM estoque_minimo WHERE tipo = ? AND status = ?",
+
+    # Ações em lote: um comando por tabela, sobre a lista de ids (json_each/ANY).
+    # As exclusões descem a cascata à mão (o SQLite não aplica as chaves
+    # estrangeiras e no Postgres elas não têm ON DELETE)
+    'ordens_status_lote': {
+        'sqlite': "UPDATE ordens_servico SET status = ? WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "UPDATE ordens_servico SET status = ? WHERE id = ANY(?)",
+    },
+    'ordens_itens_excluir_lote': {
+        'sqlite': "DELETE FROM itens_ordem WHERE ordem_id IN (SELECT value FROM json_each(?))",
+        'postgres': "DELETE FROM itens_ordem WHERE ordem_id = ANY(?)",
+    },
+    'ordens_excluir_lote': {
+        'sqlite': "DELETE FROM ordens_servico WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "DELETE FROM ordens_servico WHERE id = ANY(?)",
+    },
+    'estoque_status_lote': {
+        'sqlite': "UPDATE estoque SET status = ? WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "UPDATE estoque SET status = ? WHERE id = ANY(?)",
+    },
+    'estoque_liberar_lote': {
+        'sqlite': "UPDATE estoque SET data_saida = ? WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "UPDATE estoque SET data_saida = ? WHERE id = ANY(?)",
+    },
+    'estoque_excluir_lote': {
+        'sqlite': "DELETE FROM estoque WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "DELETE FROM estoque WHERE id = ANY(?)",
+    },
+    'clientes_itens_excluir_lote': {
+        'sqlite': """
+            DELETE FROM itens_ordem WHERE ordem_id IN (
+                SELECT id FROM ordens_servico WHERE cliente_id IN (SELECT value FROM json_each(?))
+            )
+        """,
+        'postgres': """
+            DELETE FROM itens_ordem WHERE ordem_id IN (
+                SELECT id FROM ordens_servico WHERE cliente_id = ANY(?)
+            )
+        """,
+    },
+    'clientes_ordens_excluir_lote': {
+        'sqlite': "DELETE FROM ordens_servico WHERE cliente_id IN (SELECT value FROM json_each(?))",
+        'postgres': "DELETE FROM ordens_servico WHERE cliente_id = ANY(?)",
+    },
+    # Produto reservado para um cliente excluído volta a ser estoque livre
+    'clientes_estoque_soltar_lote': {
+        'sqlite': "UPDATE estoque SET cliente_id = NULL WHERE cliente_id IN (SELECT value FROM json_each(?))",
+        'postgres': "UPDATE estoque SET cliente_id = NULL WHERE cliente_id = ANY(?)",
+    },
+    'clientes_excluir_lote': {
+        'sqlite': "DELETE FROM clientes WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "DELETE FROM clientes WHERE id = ANY(?)",
+    },
+
+    # Painel da página inicial
+    'painel_ordens_status': "SELECT status, COUNT(*) FROM ordens_servico GROUP BY status",
+    'painel_ordens_semana': """
+        SELECT data_servico, COUNT(*)
+        FROM ordens_servico
+        WHERE COALESCE(data_servico, '') BETWEEN ? AND ?
+        GROUP BY data_servico
+    """,
+    'painel_ordens_atrasadas': """
+        SELECT COUNT(*)
+        FROM ordens_servico
+        WHERE status IN (?, ?) AND data_servico <> '' AND data_servico < ?
+    """,
+    'painel_estoque': """
+        SELECT CASE WHEN cliente_id = 0 THEN 'livre' ELSE 'reservado' END, SUM(quantidade)
+        FROM estoque_resumo
+        WHERE status <> ?
+        GROUP BY CASE WHEN cliente_id = 0 THEN 'livre' ELSE 'reservado' END
+    """,
+    'painel_top_clientes': """
+        SELECT c.id, c.nome, t.ordens
+        FROM (
+            SELECT cliente_id, COUNT(*) AS ordens
+            FROM ordens_servico
+            GROUP BY cliente_id
+            ORDER BY ordens DESC, cliente_id
+            LIMIT ?
+        ) t
+        JOIN clientes c ON c.id = t.cliente_id
+        ORDER BY t.ordens DESC, c.nome
+    """,
+
+    # Tarefas em segundo plano (tarefas.py)
+    'tarefa_inserir': """
+        INSERT INTO tarefas (tipo, parametros, status, max_tentativas, criada_em, atualizada_em, executar_apos)
+        VALUES (?, ?, 'pendente', ?, ?, ?, ?)
+    """,
+    'tarefa_por_id': """
+        SELECT id, tipo, parametros, status, tentativas, max_tentativas, progresso, mensagem, arquivo, erro,
+               criada_em, iniciada_em, concluida_em
+        FROM tarefas WHERE id = ?
+    """,
+    'tarefas_recentes': """
+        SELECT id, tipo, parametros, status, tentativas, max_tentativas, progresso, mensagem, arquivo, erro,
+               criada_em, iniciada_em, concluida_em
+        FROM tarefas ORDER BY id DESC LIMIT ?
+    """,
+    'tarefas_pendentes_tipos': "SELECT DISTINCT tipo FROM tarefas WHERE status = 'pendente' AND executar_apos <= ?",
+    'tarefas_travar': "SELECT pg_advisory_xact_lock(7420002)",
+    # Reserva a próxima do tipo se o limite de execuções simultâneas permitir;
+    # no SQLite o UPDATE já é exclusivo, no Postgres vem depois de tarefas_travar
+    'tarefa_reservar': {
+        'sqlite': """
+            UPDATE tarefas
+            SET status = 'executando', tentativas = tentativas + 1, mensagem = NULL,
+                iniciada_em = ?, atualizada_em = ?
+            WHERE id = (
+                SELECT id FROM tarefas
+                WHERE status = 'pendente' AND tipo = ? AND executar_apos <= ?
+                  AND (SELECT COUNT(*) FROM tarefas WHERE tipo = ? AND status = 'executando') < ?
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id, parametros, tentativas, max_tentativas
+        """,
+        'postgres': """
+            UPDATE tarefas
+            SET status = 'executando', tentativas = tentativas + 1, mensagem = NULL,
+                iniciada_em = ?, atualizada_em = ?
+            WHERE id = (
+                SELECT id FROM tarefas
+                WHERE status = 'pendente' AND tipo = ? AND executar_apos <= ?
+                  AND (SELECT COUNT(*) FROM tarefas WHERE tipo = ? AND status = 'executando') < ?
+                ORDER BY id LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, parametros, tentativas, max_tentativas
+        """,
+    },
+    'tarefa_progresso': """
+        UPDATE tarefas SET progresso = ?, mensagem = COALESCE(?, mensagem), atualizada_em = ? WHERE id = ?
+    """,
+    'tarefa_concluir': """
+        UPDATE tarefas
+        SET status = 'concluida', progresso = 1, arquivo = ?, erro = NULL, concluida_em = ?, atualizada_em = ?
+        WHERE id = ?
+    """,
+    'tarefa_adiar': """
+        UPDATE tarefas SET status = 'pendente', erro = ?, executar_apos = ?, atualizada_em = ? WHERE id = ?
+    """,
+    'tarefa_falhar': """
+        UPDATE tarefas SET status = 'falhou', erro = ?, concluida_em = ?, atualizada_em = ? WHERE id = ?
+    """,
+    'tarefas_sinal': {
+        'sqlite': "UPDATE tarefas SET atualizada_em = ? WHERE id IN (SELECT value FROM json_each(?))",
+        'postgres': "UPDATE tarefas SET atualizada_em = ? WHERE id = ANY(?)",
+    },
+    'tarefas_abandonadas_falhar': """
+        UPDATE tarefas SET status = 'falhou', erro = ?, concluida_em = ?
+        WHERE status = 'executando' AND atualizada_em < ? AND tentativas >= max_tentativas
+    """,
+    'tarefas_abandonadas_repor': """
+        UPDATE tarefas SET status = 'pendente', erro = ?, executar_apos = ?
+        WHERE status = 'executando' AND atualizada_em < ?
+    """,
+    'tarefas_antigas': "SELECT arquivo FROM tarefas WHERE status IN ('concluida', 'falhou') AND concluida_em < ?",
+    'tarefas_excluir_antigas': "DELETE FROM tarefas WHERE status IN ('concluida', 'falhou') AND concluida_em < ?",
+
+    # Esquema
+    'alteracoes_versoes': "SELECT tabela, versao FROM alteracoes_tabela",
+    'alteracoes_podar': "DELETE FROM alteracoes_log WHERE alterado_em < ?",
+    'esquema_registrar': "INSERT INTO schema_versao (versao, descricao, aplicada_em) VALUES (?, ?, ?)",
+}
+
+# Comandos em lote: executemany no SQLite, execute_values (VALUES de várias
+# linhas num único comando) no Postgres
+LOTES = {
+    'itens_inserir': {
+        'sqlite': """
+            INSERT INTO itens_ordem (ordem_id, tipo, altura, comprimento, material)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+        'postgres': """
+            INSERT INTO itens_ordem (ordem_id, tipo, altura, comprimento, material)
+            VALUES %s
+        """,
+    },
+    'itens_atualizar': {
+        'sqlite': """
+            UPDATE itens_ordem
+            SET tipo=?, altura=?, comprimento=?, material=?
+            WHERE id=?
+        """,
+        'postgres': """
+            UPDATE itens_ordem AS i
+            SET tipo = v.tipo, altura = v.altura, comprimento = v.comprimento, material = v.material
+            FROM (VALUES %s) AS v (tipo, altura, comprimento, material, id)
+            WHERE i.id = v.id
+        """,
+    },
+}
+
+# Cargas em massa: COPY ... FROM STDIN no Postgres, executemany no SQLite
+COPIAS = {
+    'clientes': ('clientes', ['nome', 'cpf_cnpj', 'endereco', 'telefone', 'email']),
+    'estoque': ('estoque', ['nome_produto', 'tipo', 'quantidade', 'status', 'cliente_id',
+                            'data_entrada', 'data_saida', 'observacoes']),
+}
+
+dialeto = 'sqlite'
+preparar = True
+
+_trava = threading.Lock()
+_renderizadas = {}
+_estatisticas = {}
+_classe_conexao_postgres = None
+
+
+def configurar(postgres, preparar_comandos=True):
+    global dialeto, preparar
+    dialeto = 'postgres' if postgres else 'sqlite'
+    preparar = preparar_comandos
+    _renderizadas.clear()
+
+
+def conexao_postgres():
+    """Classe de conexão psycopg2 que lembra quais comandos já preparou."""
+    global _classe_conexao_postgres
+    if _classe_conexao_postgres is None:
+        import psycopg2.extensions
+
+        class ConexaoPostgres(psycopg2.extensions.connection):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.preparadas = set()
+
+        _classe_conexao_postgres = ConexaoPostgres
+    return _classe_conexao_postgres
+
+
+def lista(valores):
+    """Parâmetro com uma lista de valores (para itens_excluir e afins)."""
+    valores = list(valores)
+    return json.dumps(valores) if dialeto == 'sqlite' else valores
+
+
+def _renderizar(nome, sql):
+    chave = (nome, dialeto)
+    renderizada = _renderizadas.get(chave)
+    if renderizada is None:
+        if isinstance(sql, dict):
+            sql = sql[dialeto]
+        sql = ' '.join(sql.split())
+        if dialeto == 'sqlite':
+            renderizada = (sql, None, None)
+        else:
+            partes = sql.split('?')
+            total = len(partes) - 1
+            # Texto para o PREPARE ($1, $2, ...) e para a execução direta (%s)
+            numerada = partes[0] + ''.join(f'${i}{parte}' for i, parte in enumerate(partes[1:], 1))
+            direta = '%s'.join(parte.replace('%', '%%') for parte in partes)
+            renderizada = (direta, numerada, total)
+        _renderizadas[chave] = renderizada
+    return renderizada
+
+
+def _contar(nome, inicio):
+    duracao = time.perf_counter() - inicio
+    with _trava:
+        registro = _estatisticas.setdefault(nome, [0, 0.0])
+        registro[0] += 1
+        registro[1] += duracao
+
+
+def _executar(cursor, nome, sql, params):
+    direta, numerada, total = _renderizar(nome, sql)
+    inicio = time.perf_counter()
+    try:
+        preparadas = getattr(cursor.connection, 'preparadas', None)
+        if dialeto == 'postgres' and preparar and preparadas is not None:
+            if nome not in preparadas:
+                cursor.execute(f"PREPARE {nome} AS {numerada}")
+                preparadas.add(nome)
+            if total:
+                cursor.execute(f"EXECUTE {nome} ({', '.join(['%s'] * total)})", tuple(params))
+            else:
+                cursor.execute(f"EXECUTE {nome}")
+        else:
+            cursor.execute(direta, tuple(params))
+    finally:
+        _contar(nome, inicio)
+    return cursor
+
+
+def executar(cursor, nome, params=()):
+    """Executa a consulta registrada em CONSULTAS com o nome dado."""
+    return _executar(cursor, nome, CONSULTAS[nome], params)
+
+
+def executar_sql(cursor, prefixo, sql, params=()):
+    """Executa SQL montado em tempo de execução (paginação, busca...).
+
+    O texto usa "?" como as consultas registradas; cada variante distinta
+    ganha um nome estável (prefixo + hash) e é preparada como as demais.
+    """
+    nome = f"{prefixo}_{hashlib.md5(sql.encode()).hexdigest()[:10]}"
+    return _executar(cursor, nome, sql, params)
+
+
+def inserir(cursor, nome, params=()):
+    """Executa um INSERT registrado e devolve o id gerado."""
+    if dialeto == 'postgres':
+        _executar(cursor, f"{nome}_id", CONSULTAS[nome].rstrip() + " RETURNING id", params)
+        return cursor.fetchone()[0]
+    executar(cursor, nome, params)
+    return cursor.lastrowid
+
+
+def executar_lote(cursor, nome, linhas):
+    linhas = list(linhas)
+    if not linhas:
+        return
+    sql = ' '.join(LOTES[nome][dialeto].split())
+    inicio = time.perf_counter()
+    try:
+        if dialeto == 'postgres':
+            from psycopg2.extras import execute_values
+            execute_values(cursor, sql, linhas, page_size=500)
+        else:
+            cursor.executemany(sql, linhas)
+    finally:
+        _contar(nome, inicio)
+
+
+def copiar(cursor, nome, linhas):
+    """Carrega as linhas (tuplas na ordem de COPIAS[nome]) na tabela."""
+    linhas = list(linhas)
+    if not linhas:
+        return
+    tabela, colunas = COPIAS[nome]
+    inicio = time.perf_counter()
+    try:
+        if dialeto == 'postgres':
+            # No formato csv do COPY, campo vazio sem aspas é NULL
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(linhas)
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        else:
+            marcadores = ', '.join('?' * len(colunas))
+            cursor.executemany(f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({marcadores})", linhas)
+    finally:
+        _contar(f'copiar_{nome}', inicio)
+
+
+def iterar(conn, prefixo, sql, params=(), lote=1000):
+    """Percorre o resultado em blocos de até `lote` linhas, sem carregar tudo.
+
+    No Postgres usa um cursor nomeado (do lado do servidor), que traz `lote`
+    linhas por round trip; no SQLite o próprio cursor já anda passo a passo.
+    Cursores nomeados não aceitam EXECUTE de um comando preparado, então aqui
+    a execução é sempre direta.
+    """
+    nome = f"{prefixo}_{hashlib.md5(sql.encode()).hexdigest()[:10]}"
+    direta = _renderizar(nome, sql)[0]
+    if dialeto == 'postgres':
+        cursor = conn.cursor(name=nome)
+        cursor.itersize = lote
+    else:
+        cursor = conn.cursor()
+    inicio = time.perf_counter()
+    try:
+        cursor.execute(direta, tuple(params))
+        while True:
+            linhas = cursor.fetchmany(lote)
+            if not linhas:
+                break
+            yield linhas
+    finally:
+        cursor.close()
+        _contar(nome, inicio)
+
+
+def estatisticas():
+    with _trava:
+        return {
+            nome: {'execucoes': execucoes, 'tempo_total': round(tempo, 6),
+                   'tempo_medio': round(tempo / execucoes, 6) if execucoes else 0.0}
+            for nome, (execucoes, tempo) in sorted(_estatisticas.items())
+        }
@@ -0,0 +1,81 @@
+"""Arquivos estáticos com impressão digital e compressão das respostas.
+
+Cada arquivo de static/ ganha uma impressão (hash do conteúdo) que entra na
+URL; como a URL muda sempre que o arquivo muda, o navegador pode guardá-lo
+"para sempre". Os estáticos são comprimidos uma vez por processo e servidos
+da memória; as páginas e o JSON são comprimidos a cada resposta.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    # Sem o pacote, só gzip
+    brotli = None
+
+PASTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+COMPRIMIVEIS = {'text/html', 'text/css', 'text/plain', 'text/csv', 'application/json',
+                'application/javascript', 'text/javascript', 'image/svg+xml'}
+# Níveis rápidos para as respostas dinâmicas; os estáticos usam o máximo
+NIVEL_GZIP = int(os.getenv('COMPRIMIR_NIVEL_GZIP', '6'))
+NIVEL_BROTLI = int(os.getenv('COMPRIMIR_NIVEL_BROTLI', '5'))
+
+_trava = threading.Lock()
+_manifesto = None
+_conteudos = {}
+
+
+def manifesto(recarregar=False):
+    """{caminho relativo: impressão} de todos os arquivos de static/."""
+    global _manifesto
+    with _trava:
+        if _manifesto is None or recarregar:
+            novo = {}
+            for raiz, _, arquivos in os.walk(PASTA):
+                for nome in arquivos:
+                    completo = os.path.join(raiz, nome)
+                    with open(completo, 'rb') as arquivo:
+                        impressao = hashlib.sha256(arquivo.read()).hexdigest()[:12]
+                    novo[os.path.relpath(completo, PASTA).replace(os.sep, '/')] = impressao
+            _manifesto = novo
+            _conteudos.clear()
+        return _manifesto
+
+
+def tipo(caminho):
+    return mimetypes.guess_type(caminho)[0] or 'application/octet-stream'
+
+
+def codificacao(aceitas, mimetype):
+    """'br', 'gzip' ou None, conforme o Accept-Encoding e o tipo do conteúdo."""
+    if mimetype not in COMPRIMIVEIS:
+        return None
+    if brotli is not None and aceitas['br']:
+        return 'br'
+    if aceitas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir(dados, codificacao, maximo=False):
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=11 if maximo else NIVEL_BROTLI)
+    # mtime=0: o mesmo conteúdo gera sempre os mesmos bytes
+    return gzip.compress(dados, compresslevel=9 if maximo else NIVEL_GZIP, mtime=0)
+
+
+def conteudo(caminho, codificacao=None):
+    """Bytes do arquivo (comprimidos, se pedido), lidos e comprimidos uma única vez."""
+    chave = (caminho, codificacao)
+    dados = _conteudos.get(chave)
+    if dados is None:
+        with open(os.path.join(PASTA, caminho), 'rb') as arquivo:
+            dados = arquivo.read()
+        if codificacao:
+            dados = comprimir(dados, codificacao, maximo=True)
+        _conteudos[chave] = dados
+    return dados
@@ -0,0 +1,106 @@
+"""Métricas da aplicação no formato texto do Prometheus.
+
+Contadores e histogramas simples, seguros entre threads, guardados em memória
+do processo. Com vários workers do gunicorn cada um tem os seus números, por
+isso toda série leva o rótulo `pid`; no Prometheus, some com `sum without (pid)`.
+"""
+import bisect
+import os
+import threading
+
+# Faixas (em segundos) dos histogramas de latência
+FAIXAS_TEMPO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAIXAS_QUANTIDADE = (1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+_registro = []
+
+
+def _rotulos(nomes, valores):
+    if not nomes:
+        return ''
+    pares = []
+    for nome, valor in zip(nomes, valores):
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pares.append(f'{nome}="{valor}"')
+    return '{' + ','.join(pares) + '}'
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos) + ('pid',)
+        self._valores = {}
+        self._trava = threading.Lock()
+        _registro.append(self)
+
+    def somar(self, *rotulos, valor=1):
+        chave = tuple(rotulos) + (os.getpid(),)
+        with self._trava:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def definir(self, *rotulos, valor):
+        # Para totais acumulados em outro lugar (pool, consultas.estatisticas)
+        chave = tuple(rotulos) + (os.getpid(),)
+        with self._trava:
+            self._valores[chave] = valor
+
+    def linhas(self):
+        with self._trava:
+            valores = sorted(self._valores.items())
+        for chave, valor in valores:
+            yield f'{self.nome}{_rotulos(self.rotulos, chave)} {valor}'
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (conexões em uso, por exemplo)."""
+    tipo = 'gauge'
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), faixas=FAIXAS_TEMPO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos) + ('pid',)
+        self.faixas = tuple(faixas)
+        self._series = {}
+        self._trava = threading.Lock()
+        _registro.append(self)
+
+    def observar(self, valor, *rotulos):
+        chave = tuple(rotulos) + (os.getpid(),)
+        posicao = bisect.bisect_left(self.faixas, valor)
+        with self._trava:
+            serie = self._series.get(chave)
+            if serie is None:
+                # contagem por faixa (+ a faixa +Inf), soma, total
+                serie = self._series[chave] = [[0] * (len(self.faixas) + 1), 0.0, 0]
+            serie[0][posicao] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def linhas(self):
+        with self._trava:
+            series = sorted((chave, ([*contagens], soma, total))
+                            for chave, (contagens, soma, total) in self._series.items())
+        nomes = self.rotulos + ('le',)
+        for chave, (contagens, soma, total) in series:
+            acumulado = 0
+            for faixa, contagem in zip(self.faixas + ('+Inf',), contagens):
+                acumulado += contagem
+                yield f'{self.nome}_bucket{_rotulos(nomes, chave + (faixa,))} {acumulado}'
+            yield f'{self.nome}_sum{_rotulos(self.rotulos, chave)} {soma}'
+            yield f'{self.nome}_count{_rotulos(self.rotulos, chave)} {total}'
+
+
+def renderizar():
+    partes = []
+    for metrica in _registro:
+        partes.append(f'# HELP {metrica.nome} {metrica.ajuda}')
+        partes.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+        partes.extend(metrica.linhas())
+    return '\n'.join(partes) + '\n'
@@ -0,0 +1,436 @@
+"""Sincronização incremental entre o banco local (SQLite) e o servidor (Postgres).
+
+Cada banco registra em alteracoes_log, por trigger, toda inclusão, alteração
+e exclusão nas quatro tabelas. Sincronizar é enviar o que mudou aqui desde o
+último envio e receber o que mudou lá desde o último recebimento, em lotes,
+cada lote numa transação de cada lado. O log só diz quais registros mudaram:
+deles se lê o estado atual, então várias alterações do mesmo registro viajam
+uma vez só, e nunca se copia a tabela inteira.
+
+Cada banco numera os próprios registros, então o servidor guarda em
+sincronizacao_mapa, por dispositivo, o id local de cada registro que veio
+dele ou foi para ele; o mapa é gravado na transação do próprio servidor.
+
+Conflito (o mesmo registro alterado dos dois lados entre duas
+sincronizações): vence a alteração mais recente pelo relógio de quem a fez,
+e o empate fica com o servidor. Exclusão conta como alteração.
+"""
+import json
+import socket
+import uuid
+
+# tabela -> (colunas copiadas, (coluna de referência, tabela referenciada)),
+# com as tabelas referenciadas antes das que as referenciam
+TABELAS = {
+    'clientes': (['nome', 'cpf_cnpj', 'endereco', 'telefone', 'email'], None),
+    'ordens_servico': (['data_servico', 'hora_servico', 'local_servico', 'comprimento', 'altura',
+                        'materiais', 'status'], ('cliente_id', 'clientes')),
+    'itens_ordem': (['tipo', 'altura', 'comprimento', 'material'], ('ordem_id', 'ordens_servico')),
+    'estoque': (['nome_produto', 'tipo', 'quantidade', 'status', 'data_entrada', 'data_saida',
+                 'observacoes'], ('cliente_id', 'clientes')),
+}
+ORDEM = list(TABELAS)
+
+# O que acompanha a exclusão no banco de destino, como nas exclusões em lote
+# do app ({} vira o filtro pela lista de ids)
+CASCATA = {
+    'clientes': [
+        "DELETE FROM itens_ordem WHERE ordem_id IN (SELECT id FROM ordens_servico WHERE {})",
+        "DELETE FROM ordens_servico WHERE {}",
+        "UPDATE estoque SET cliente_id = NULL WHERE {}",
+    ],
+    'ordens_servico': ["DELETE FROM itens_ordem WHERE {}"],
+}
+COLUNA_CASCATA = {'clientes': 'cliente_id', 'ordens_servico': 'ordem_id'}
+
+
+class Banco:
+    """Uma ponta da sincronização: a conexão e o dialeto dela."""
+
+    def __init__(self, conn, postgres):
+        self.conn = conn
+        self.postgres = postgres
+        self._marco = None
+
+    def executar(self, cursor, sql, params=()):
+        sql = ' '.join(sql.split())
+        cursor.execute(sql.replace('?', '%s') if self.postgres else sql, tuple(params))
+        return cursor
+
+    def varios(self, cursor, sql, linhas):
+        if not linhas:
+            return
+        sql = ' '.join(sql.split())
+        if self.postgres:
+            from psycopg2.extras import execute_batch
+            execute_batch(cursor, sql.replace('?', '%s'), linhas, page_size=200)
+        else:
+            cursor.executemany(sql, linhas)
+
+    def em(self, coluna):
+        """Filtro "coluna pertence à lista" (a lista vai como um parâmetro só)."""
+        if self.postgres:
+            return f"{coluna} = ANY(?)"
+        return f"{coluna} IN (SELECT value FROM json_each(?))"
+
+    def lista(self, valores):
+        valores = list(valores)
+        return valores if self.postgres else json.dumps(valores)
+
+    def inserir(self, cursor, tabela, colunas, linhas):
+        """Insere as linhas e devolve os ids gerados, na mesma ordem."""
+        if not linhas:
+            return []
+        if self.postgres:
+            # Reserva os ids de uma vez e insere tudo num só comando
+            from psycopg2.extras import execute_values
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                           (tabela, len(linhas)))
+            ids = [linha[0] for linha in cursor.fetchall()]
+            execute_values(cursor, f"INSERT INTO {tabela} (id, {', '.join(colunas)}) VALUES %s",
+                           [(id, *valores) for id, valores in zip(ids, linhas)], page_size=500)
+            return ids
+        sql = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+        ids = []
+        for valores in linhas:
+            cursor.execute(sql, valores)
+            ids.append(cursor.lastrowid)
+        return ids
+
+    def iniciar(self, cursor, dispositivo=None):
+        """Abre a transação de escrita; o que os triggers registrarem nela fica
+        com a origem `dispositivo`, para não voltar a quem mandou."""
+        if self.postgres:
+            if dispositivo:
+                cursor.execute("SELECT set_config('sincronizacao.origem', %s, true)", (dispositivo,))
+            return
+        cursor.execute("BEGIN IMMEDIATE")
+        # O SQLite tem um escritor por vez: tudo depois do marco é desta transação
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM alteracoes_log")
+        self._marco = cursor.fetchone()[0]
+
+    def marcar_origem(self, cursor, dispositivo):
+        if not self.postgres:
+            cursor.execute("UPDATE alteracoes_log SET origem = ? WHERE seq > ?", (dispositivo, self._marco))
+
+    def descartar_registro(self, cursor):
+        """Apaga do log o que a transação aberta por iniciar() gerou."""
+        cursor.execute("DELETE FROM alteracoes_log WHERE seq > ?", (self._marco,))
+
+    def limite_leitura(self, cursor, atraso):
+        """Momento até o qual o log já está completo.
+
+        No Postgres a sequência é distribuída antes do commit: uma transação
+        longa pode gravar um seq menor depois de um maior já visível. Só se
+        avança além de alterações com mais de `atraso` segundos.
+        """
+        if not self.postgres or not atraso:
+            return None
+        cursor.execute("""SELECT to_char((clock_timestamp() - make_interval(secs => %s)) AT TIME ZONE 'UTC',
+                                         'YYYY-MM-DD"T"HH24:MI:SS.MS')""", (atraso,))
+        return cursor.fetchone()[0]
+
+
+def estado(banco, cursor, chave, padrao=None):
+    banco.executar(cursor, "SELECT valor FROM sincronizacao_estado WHERE chave = ?", (chave,))
+    linha = cursor.fetchone()
+    return linha[0] if linha else padrao
+
+
+def gravar_estado(banco, cursor, chave, valor):
+    banco.executar(cursor, """
+        INSERT INTO sincronizacao_estado (chave, valor) VALUES (?, ?)
+        ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor
+    """, (chave, str(valor)))
+
+
+def _ler(banco, cursor, tabela, ids):
+    """{id: (colunas..., referência)} dos registros que ainda existem."""
+    if not ids:
+        return {}
+    colunas, referencia = TABELAS[tabela]
+    selecao = ['id', *colunas] + ([referencia[0]] if referencia else [])
+    banco.executar(cursor, f"SELECT {', '.join(selecao)} FROM {tabela} WHERE {banco.em('id')}",
+                   (banco.lista(ids),))
+    return {linha[0]: tuple(linha[1:]) for linha in cursor.fetchall()}
+
+
+def _gravar(banco, cursor, tabela, linhas):
+    """Grava [(id no destino ou None, valores)]; devolve os ids no destino.
+
+    Id mapeado que não existe mais no destino vira inclusão.
+    """
+    colunas, referencia = TABELAS[tabela]
+    colunas = colunas + ([referencia[0]] if referencia else [])
+    conhecidos = [id for id, _ in linhas if id is not None]
+    existentes = set()
+    if conhecidos:
+        banco.executar(cursor, f"SELECT id FROM {tabela} WHERE {banco.em('id')}", (banco.lista(conhecidos),))
+        existentes = {linha[0] for linha in cursor.fetchall()}
+    banco.varios(cursor, f"UPDATE {tabela} SET {', '.join(f'{c} = ?' for c in colunas)} WHERE id = ?",
+                 [(*valores, id) for id, valores in linhas if id in existentes])
+    novos = iter(banco.inserir(cursor, tabela, colunas,
+                               [valores for id, valores in linhas if id not in existentes]))
+    return [id if id in existentes else next(novos) for id, _ in linhas]
+
+
+def _excluir(banco, cursor, tabela, ids):
+    if not ids:
+        return
+    lista = banco.lista(ids)
+    for sql in CASCATA.get(tabela, []):
+        banco.executar(cursor, sql.format(banco.em(COLUNA_CASCATA[tabela])), (lista,))
+    banco.executar(cursor, f"DELETE FROM {tabela} WHERE {banco.em('id')}", (lista,))
+
+
+def _agrupar(linhas, ignorar_origem=None):
+    """{tabela: {id: alteração mais recente}} a partir de linhas do log."""
+    alteradas = {tabela: {} for tabela in ORDEM}
+    for _, tabela, registro_id, alterado_em, origem in linhas:
+        if tabela in alteradas and (ignorar_origem is None or origem != ignorar_origem):
+            anterior = alteradas[tabela].get(registro_id)
+            if anterior is None or alterado_em > anterior:
+                alteradas[tabela][registro_id] = alterado_em
+    return alteradas
+
+
+def transferir(origem, cursor_origem, destino, cursor_destino, alteradas, mapa, concorrentes, empate_destino):
+    """Leva ao destino o estado atual dos registros alterados na origem.
+
+    alteradas: {tabela: {id na origem: momento da alteração}}
+    mapa(tabela, ids na origem) -> {id na origem: id no destino}
+    concorrentes(tabela, ids no destino) -> {id no destino: momento de uma
+        alteração feita lá que a origem ainda não viu}
+    Devolve as contagens, os ids gravados ou excluídos no destino por tabela
+    e as mudanças de mapa, [(tabela, id origem, id destino)]: registros novos
+    no destino, excluídos, e os que foram recriados lá com outro id.
+    """
+    registros = {}
+    traducao = {tabela: {} for tabela in ORDEM}
+    # Dos filhos para os pais: referência a um registro que o destino ainda
+    # não conhece leva o registro junto
+    for tabela in reversed(ORDEM):
+        ids = alteradas[tabela]
+        registros[tabela] = _ler(origem, cursor_origem, tabela, list(ids))
+        traducao[tabela].update(mapa(tabela, list(ids)))
+        referencia = TABELAS[tabela][1]
+        if referencia:
+            pai = referencia[1]
+            pais = {valores[-1] for valores in registros[tabela].values() if valores[-1] is not None}
+            traducao[pai].update(mapa(pai, list(pais - set(alteradas[pai]) - set(traducao[pai]))))
+            for id in pais - set(alteradas[pai]) - set(traducao[pai]):
+                alteradas[pai][id] = ''
+
+    def perde(tabela, pares):
+        datas = concorrentes(tabela, [destino_id for _, destino_id in pares])
+        return {origem_id for origem_id, destino_id in pares
+                if destino_id in datas and (datas[destino_id] > alteradas[tabela][origem_id]
+                                            or empate_destino and datas[destino_id] == alteradas[tabela][origem_id])}
+
+    resultado = {'gravados': 0, 'excluidos': 0, 'conflitos': 0, 'aplicados': {tabela: [] for tabela in ORDEM},
+                 'novos': [], 'removidos': [], 'substituidos': []}
+    for tabela in ORDEM:
+        referencia = TABELAS[tabela][1]
+        existentes = registros[tabela]
+        pares = [(id, traducao[tabela][id]) for id in existentes if id in traducao[tabela]]
+        perdidos = perde(tabela, pares)
+        resultado['conflitos'] += len(perdidos)
+        ids, linhas = [], []
+        for id, valores in existentes.items():
+            if id in perdidos:
+                continue
+            if referencia:
+                valores = valores[:-1] + (traducao[referencia[1]].get(valores[-1]),)
+            ids.append(id)
+            linhas.append((traducao[tabela].get(id), valores))
+        for id, (anterior, _), gravado in zip(ids, linhas, _gravar(destino, cursor_destino, tabela, linhas)):
+            if anterior != gravado:
+                if anterior is not None:
+                    resultado['substituidos'].append((tabela, id, anterior))
+                traducao[tabela][id] = gravado
+                resultado['novos'].append((tabela, id, gravado))
+            resultado['aplicados'][tabela].append(gravado)
+        resultado['gravados'] += len(ids)
+
+    # Exclusões dos filhos para os pais
+    for tabela in reversed(ORDEM):
+        pares = [(id, traducao[tabela][id]) for id in alteradas[tabela]
+                 if id not in registros[tabela] and id in traducao[tabela]]
+        perdidos = perde(tabela, pares)
+        resultado['conflitos'] += len(perdidos)
+        excluir = [(id, destino_id) for id, destino_id in pares if id not in perdidos]
+        _excluir(destino, cursor_destino, tabela, [destino_id for _, destino_id in excluir])
+        resultado['removidos'] += [(tabela, id, destino_id) for id, destino_id in excluir]
+        resultado['aplicados'][tabela] += [destino_id for _, destino_id in excluir]
+        resultado['excluidos'] += len(excluir)
+    return resultado
+
+
+class Sincronizacao:
+    """Envia e recebe as alterações entre o banco local e o servidor."""
+
+    def __init__(self, local, remoto, lote=500, atraso=30):
+        self.local = local
+        self.remoto = remoto
+        self.lote = lote
+        self.atraso = atraso
+        self.resultado = {'enviados': 0, 'excluidos_la': 0, 'recebidos': 0, 'excluidos_aqui': 0,
+                          'conflitos': 0, 'lotes': 0}
+
+    def dispositivo(self, cursor):
+        """Identificação deste banco local junto ao servidor, criada na primeira vez."""
+        dispositivo = estado(self.local, cursor, 'dispositivo')
+        if dispositivo is None:
+            dispositivo = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+            gravar_estado(self.local, cursor, 'dispositivo', dispositivo)
+            self.local.conn.commit()
+        return dispositivo
+
+    def _mapa(self, cursor, dispositivo, de, para):
+        def mapa(tabela, ids):
+            if not ids:
+                return {}
+            self.remoto.executar(cursor, f"""
+                SELECT {de}, {para} FROM sincronizacao_mapa
+                WHERE dispositivo = ? AND tabela = ? AND {self.remoto.em(de)}
+            """, (dispositivo, tabela, self.remoto.lista(ids)))
+            return dict(cursor.fetchall())
+        return mapa
+
+    def _atualizar_mapa(self, cursor, dispositivo, novos, removidos):
+        self.remoto.varios(cursor, """
+            INSERT INTO sincronizacao_mapa (dispositivo, tabela, id_local, id_remoto) VALUES (?, ?, ?, ?)
+            ON CONFLICT (dispositivo, tabela, id_local) DO UPDATE SET id_remoto = excluded.id_remoto
+        """, [(dispositivo, *linha) for linha in novos])
+        self.remoto.varios(cursor, "DELETE FROM sincronizacao_mapa WHERE dispositivo = ? AND tabela = ? AND id_local = ?",
+                           [(dispositivo, tabela, id_local) for tabela, id_local, _ in removidos])
+
+    def _log(self, banco, cursor, depois):
+        banco.executar(cursor, """
+            SELECT seq, tabela, registro_id, alterado_em, origem FROM alteracoes_log
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        """, (depois, self.lote))
+        return cursor.fetchall()
+
+    def enviar(self, dispositivo):
+        """Manda ao servidor, lote a lote, o que está no log local."""
+        cursor_local = self.local.conn.cursor()
+        cursor_remoto = self.remoto.conn.cursor()
+        while True:
+            enviado = int(estado(self.local, cursor_local, 'enviado_ate', 0))
+            recebido = int(estado(self.local, cursor_local, 'recebido_ate', 0))
+            # Leitura local num instantâneo só; a escrita vem depois do commit lá
+            cursor_local.execute("BEGIN")
+            linhas = self._log(self.local, cursor_local, enviado)
+            if not linhas:
+                self.local.conn.rollback()
+                break
+
+            def concorrentes(tabela, ids):
+                if not ids:
+                    return {}
+                self.remoto.executar(cursor_remoto, f"""
+                    SELECT registro_id, MAX(alterado_em) FROM alteracoes_log
+                    WHERE tabela = ? AND {self.remoto.em('registro_id')} AND seq > ?
+                      AND (origem IS NULL OR origem <> ?)
+                    GROUP BY registro_id
+                """, (tabela, self.remoto.lista(ids), recebido, dispositivo))
+                return dict(cursor_remoto.fetchall())
+
+            self.remoto.iniciar(cursor_remoto, dispositivo)
+            try:
+                feito = transferir(self.local, cursor_local, self.remoto, cursor_remoto, _agrupar(linhas),
+                                   self._mapa(cursor_remoto, dispositivo, 'id_local', 'id_remoto'),
+                                   concorrentes, empate_destino=True)
+                self.remoto.marcar_origem(cursor_remoto, dispositivo)
+                self._atualizar_mapa(cursor_remoto, dispositivo, feito['novos'], feito['removidos'])
+                self.remoto.conn.commit()
+            except Exception:
+                self.remoto.conn.rollback()
+                raise
+            finally:
+                self.local.conn.rollback()
+
+            # Se cair aqui, o lote volta a ser enviado: o mapa já está no
+            # servidor, então o reenvio só regrava os mesmos valores
+            gravar_estado(self.local, cursor_local, 'enviado_ate', linhas[-1][0])
+            self.local.executar(cursor_local, "DELETE FROM alteracoes_log WHERE seq <= ?", (linhas[-1][0],))
+            self.local.conn.commit()
+            self.resultado['enviados'] += feito['gravados']
+            self.resultado['excluidos_la'] += feito['excluidos']
+            self.resultado['conflitos'] += feito['conflitos']
+            self.resultado['lotes'] += 1
+        cursor_local.close()
+        cursor_remoto.close()
+
+    def receber(self, dispositivo):
+        """Traz do servidor, lote a lote, o que outros alteraram lá."""
+        cursor_local = self.local.conn.cursor()
+        cursor_remoto = self.remoto.conn.cursor()
+        while True:
+            recebido = int(estado(self.local, cursor_local, 'recebido_ate', 0))
+            linhas = self._log(self.remoto, cursor_remoto, recebido)
+            if not linhas:
+                self.remoto.conn.rollback()
+                break
+            limite = self.remoto.limite_leitura(cursor_remoto, self.atraso)
+            ate = recebido
+            for seq, _, _, alterado_em, _ in linhas:
+                if limite is not None and alterado_em > limite:
+                    break
+                ate = seq
+            alteradas = _agrupar(linhas, ignorar_origem=dispositivo)
+
+            def concorrentes(tabela, ids):
+                # Alterações locais ainda não enviadas
+                if not ids:
+                    return {}
+                self.local.executar(cursor_local, f"""
+                    SELECT registro_id, MAX(alterado_em) FROM alteracoes_log
+                    WHERE tabela = ? AND {self.local.em('registro_id')}
+                    GROUP BY registro_id
+                """, (tabela, self.local.lista(ids)))
+                return dict(cursor_local.fetchall())
+
+            self.local.iniciar(cursor_local)
+            try:
+                feito = transferir(self.remoto, cursor_remoto, self.local, cursor_local, alteradas,
+                                   self._mapa(cursor_remoto, dispositivo, 'id_remoto', 'id_local'),
+                                   concorrentes, empate_destino=False)
+                # O que veio do servidor não volta para ele: sai do log local,
+                # inclusive alterações locais pendentes que perderam o conflito
+                self.local.descartar_registro(cursor_local)
+                for tabela, ids in feito['aplicados'].items():
+                    if ids:
+                        self.local.executar(cursor_local, f"""
+                            DELETE FROM alteracoes_log WHERE tabela = ? AND {self.local.em('registro_id')}
+                        """, (tabela, self.local.lista(ids)))
+                gravar_estado(self.local, cursor_local, 'recebido_ate', ate)
+                self._atualizar_mapa(cursor_remoto, dispositivo,
+                                     [(tabela, local, remoto) for tabela, remoto, local in feito['novos']],
+                                     [(tabela, local, remoto) for tabela, remoto, local
+                                      in feito['removidos'] + feito['substituidos']])
+                # Primeiro o mapa no servidor: se o local falhar depois, o id
+                # mapeado não existe aqui e o próximo recebimento o recria
+                self.remoto.conn.commit()
+                self.local.conn.commit()
+            except Exception:
+                self.local.conn.rollback()
+                self.remoto.conn.rollback()
+                raise
+            self.resultado['recebidos'] += feito['gravados']
+            self.resultado['excluidos_aqui'] += feito['excluidos']
+            self.resultado['conflitos'] += feito['conflitos']
+            self.resultado['lotes'] += 1
+            if ate == recebido or len(linhas) < self.lote:
+                break
+        cursor_local.close()
+        cursor_remoto.close()
+
+    def executar(self):
+        cursor = self.local.conn.cursor()
+        dispositivo = self.dispositivo(cursor)
+        cursor.close()
+        self.enviar(dispositivo)
+        self.receber(dispositivo)
+        return self.resultado
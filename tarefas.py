@@ -0,0 +1,233 @@
+"""Fila de tarefas em segundo plano (backups, exportações, relatórios).
+
+As tarefas ficam na tabela tarefas: sobrevivem a reinícios e qualquer
+processo pode executá-las. Cada processo tem um despachante que reserva
+tarefas pendentes e as roda num pool de threads limitado. O limite por tipo
+vale para todos os processos juntos, porque é conferido no próprio comando
+que reserva a tarefa.
+
+A tarefa que falha volta para a fila com espera crescente até esgotar as
+tentativas; ValueError (parâmetro inválido) falha de vez. A tarefa de um
+processo que morreu (sem sinal de vida há `abandono` segundos) também volta.
+"""
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import consultas
+
+COLUNAS = ('id', 'tipo', 'parametros', 'status', 'tentativas', 'max_tentativas', 'progresso', 'mensagem',
+           'arquivo', 'erro', 'criada_em', 'iniciada_em', 'concluida_em')
+
+
+def momento(segundos=0):
+    return (datetime.now() + timedelta(seconds=segundos)).isoformat(timespec='seconds')
+
+
+def registro(linha):
+    tarefa = dict(zip(COLUNAS, linha))
+    tarefa['parametros'] = json.loads(tarefa['parametros'] or '{}')
+    return tarefa
+
+
+class Tarefa:
+    """O que a função de um tipo recebe: parâmetros, progresso e arquivo de resultado."""
+
+    def __init__(self, fila, id, tipo, parametros, tentativa):
+        self.fila = fila
+        self.id = id
+        self.tipo = tipo
+        self.parametros = parametros
+        self.tentativa = tentativa
+        self._ultimo_progresso = float('-inf')
+
+    def progresso(self, fracao, mensagem=None):
+        # No máximo uma escrita por segundo, por mais que a função avise
+        agora = time.monotonic()
+        if agora - self._ultimo_progresso < 1:
+            return
+        self._ultimo_progresso = agora
+        self.fila._gravar('tarefa_progresso', (round(min(max(fracao, 0), 1), 4), mensagem, momento(), self.id))
+
+    def arquivo(self, nome):
+        """Caminho para o arquivo de resultado (baixado em /tarefas/<id>/arquivo)."""
+        os.makedirs(self.fila.pasta, exist_ok=True)
+        return os.path.join(self.fila.pasta, f'{self.id}_{nome}')
+
+
+class Fila:
+    def __init__(self, conectar, pasta, threads=2, intervalo=5.0, abandono=600, espera=30, reter_dias=7):
+        self.conectar = conectar
+        self.pasta = pasta
+        self.threads = threads
+        self.intervalo = intervalo
+        self.abandono = abandono
+        self.espera = espera
+        self.reter_dias = reter_dias
+        self.tipos = {}
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._pid = None
+        self._executor = None
+        self._em_execucao = set()
+        self._ultimo_sinal = float('-inf')
+        self._ultima_limpeza = float('-inf')
+
+    def tipo(self, nome, limite=1, tentativas=3):
+        """Registra a função de um tipo: recebe a Tarefa e devolve o caminho
+        do arquivo de resultado (ou None). `limite` é quantas podem rodar ao
+        mesmo tempo, somando todos os processos."""
+        def registrar(funcao):
+            self.tipos[nome] = (funcao, limite, tentativas)
+            return funcao
+        return registrar
+
+    def enfileirar(self, tipo, parametros=None):
+        if tipo not in self.tipos:
+            raise ValueError(f'tipo de tarefa desconhecido: {tipo}')
+        conn = self.conectar()
+        cursor = conn.cursor()
+        agora = momento()
+        id = consultas.inserir(cursor, 'tarefa_inserir',
+                               (tipo, json.dumps(parametros or {}), self.tipos[tipo][2], agora, agora, agora))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        self._acordar.set()
+        return id
+
+    def consultar(self, id):
+        conn = self.conectar()
+        cursor = conn.cursor()
+        consultas.executar(cursor, 'tarefa_por_id', (id,))
+        linha = cursor.fetchone()
+        cursor.close()
+        conn.close()
+        return registro(linha) if linha else None
+
+    def recentes(self, limite=50):
+        conn = self.conectar()
+        cursor = conn.cursor()
+        consultas.executar(cursor, 'tarefas_recentes', (limite,))
+        linhas = [registro(linha) for linha in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+        return linhas
+
+    def iniciar(self):
+        """Sobe o despachante deste processo (uma vez por processo, como o pool)."""
+        if self._pid == os.getpid():
+            return
+        with self._trava:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._em_execucao = set()
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='tarefa')
+            threading.Thread(target=self._laco, name='tarefas', daemon=True).start()
+
+    def executar_para_sempre(self):
+        """Despachante em primeiro plano (processo dedicado às tarefas)."""
+        self.iniciar()
+        while True:
+            time.sleep(3600)
+
+    def _laco(self):
+        while True:
+            try:
+                self._despachar()
+            except Exception as erro:
+                print(f'⚠️ Fila de tarefas: {erro}', flush=True)
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+
+    def _gravar(self, nome, params):
+        conn = self.conectar()
+        cursor = conn.cursor()
+        consultas.executar(cursor, nome, params)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    def _despachar(self):
+        conn = self.conectar()
+        cursor = conn.cursor()
+        try:
+            if time.monotonic() - self._ultimo_sinal > self.abandono / 4:
+                self._ultimo_sinal = time.monotonic()
+                self._manutencao(cursor)
+                conn.commit()
+            if len(self._em_execucao) >= self.threads:
+                return
+            consultas.executar(cursor, 'tarefas_pendentes_tipos', (momento(),))
+            pendentes = [linha[0] for linha in cursor.fetchall() if linha[0] in self.tipos]
+            conn.rollback()
+            for tipo in pendentes:
+                funcao, limite, _ = self.tipos[tipo]
+                while len(self._em_execucao) < self.threads:
+                    if consultas.dialeto == 'postgres':
+                        # A contagem do limite e a reserva não podem ser intercaladas
+                        consultas.executar(cursor, 'tarefas_travar')
+                    agora = momento()
+                    consultas.executar(cursor, 'tarefa_reservar', (agora, agora, tipo, agora, tipo, limite))
+                    linha = cursor.fetchone()
+                    conn.commit()
+                    if linha is None:
+                        break
+                    id, parametros, tentativa, maximo = linha
+                    with self._trava:
+                        self._em_execucao.add(id)
+                    tarefa = Tarefa(self, id, tipo, json.loads(parametros or '{}'), tentativa)
+                    self._executor.submit(self._executar, funcao, tarefa, maximo)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _manutencao(self, cursor):
+        agora = momento()
+        limite = momento(-self.abandono)
+        with self._trava:
+            em_execucao = list(self._em_execucao)
+        # Sinal de vida das tarefas deste processo; as paradas há muito tempo
+        # são de um processo que morreu
+        if em_execucao:
+            consultas.executar(cursor, 'tarefas_sinal', (agora, consultas.lista(em_execucao)))
+        consultas.executar(cursor, 'tarefas_abandonadas_falhar', ('processo interrompido', agora, limite))
+        consultas.executar(cursor, 'tarefas_abandonadas_repor', ('processo interrompido', agora, limite))
+        if time.monotonic() - self._ultima_limpeza > 3600:
+            self._ultima_limpeza = time.monotonic()
+            antigas = momento(-self.reter_dias * 86400)
+            consultas.executar(cursor, 'tarefas_antigas', (antigas,))
+            pasta = os.path.abspath(self.pasta)
+            for (arquivo,) in cursor.fetchall():
+                # Só os arquivos da pasta das tarefas; um backup, por exemplo, fica
+                if arquivo and os.path.dirname(os.path.abspath(arquivo)) == pasta and os.path.exists(arquivo):
+                    os.remove(arquivo)
+            consultas.executar(cursor, 'tarefas_excluir_antigas', (antigas,))
+
+    def _executar(self, funcao, tarefa, maximo):
+        inicio = time.monotonic()
+        try:
+            arquivo = funcao(tarefa)
+            self._gravar('tarefa_concluir', (arquivo, momento(), momento(), tarefa.id))
+            print(f'✅ Tarefa {tarefa.id} ({tarefa.tipo}) concluída em {time.monotonic() - inicio:.1f}s', flush=True)
+        except Exception as erro:
+            mensagem = f'{type(erro).__name__}: {erro}'
+            if isinstance(erro, ValueError) or tarefa.tentativa >= maximo:
+                self._gravar('tarefa_falhar', (mensagem, momento(), momento(), tarefa.id))
+                print(f'❌ Tarefa {tarefa.id} ({tarefa.tipo}) falhou: {mensagem}', flush=True)
+                if not isinstance(erro, ValueError):
+                    traceback.print_exc()
+            else:
+                espera = self.espera * 2 ** (tarefa.tentativa - 1)
+                self._gravar('tarefa_adiar', (mensagem, momento(espera), momento(), tarefa.id))
+                print(f'⚠️ Tarefa {tarefa.id} ({tarefa.tipo}) falhou ({mensagem}); nova tentativa em {espera}s',
+                      flush=True)
+        finally:
+            with self._trava:
+                self._em_execucao.discard(tarefa.id)
+            self._acordar.set()